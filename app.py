@@ -1,11 +1,27 @@
 import os
+import sys
+import re
 import requests
-import json
-from flask import Flask, request, jsonify
+from requests.adapters import HTTPAdapter
+from urllib.parse import quote_plus
+from urllib3.util.retry import Retry
+import orjson
+from flask import Flask, request
 from flask_cors import CORS
+from flask_compress import Compress
 from dotenv import load_dotenv
 import google.generativeai as genai
-import time
+from google.api_core import exceptions as gexc
+import threading
+import hashlib
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from cachetools import TTLCache
+import diskcache
+import sqlite3
+from json_stream import iter_json_array
+from tenacity import retry, retry_if_exception_type, wait_random_exponential, stop_after_attempt, RetryError
 
 # --- Configuration ---
 load_dotenv()
@@ -52,12 +68,82 @@ You MUST respond only with the JSON schema provided.
 Do not add any other text or explanation.
 """
 
+# 2b. User prompt templates, parsed once at import and filled with str.format_map
+LABEL_PROMPT_TEMPLATE = """DRUG DATA FOR: {genericName}
+    ---
+    CONTRAINDICATIONS:
+    {contraindications}
+    ---
+    WARNINGS AND PRECAUTIONS:
+    {warnings_and_precautions}
+    ---
+    DRUG INTERACTIONS:
+    {drugInteractions}
+    ---
+    ADVERSE REACTIONS:
+    {adverseReactions}
+    ---
+    """
+
+USER_PROMPT_TEMPLATE = """
+    PATIENT PROFILE:
+    {profile}
+
+    {label}
+    ANALYZE and return all conflicts. If no conflicts are found, return a single "INFO" alert.
+    """
+
+CACHED_USER_PROMPT_TEMPLATE = """
+    PATIENT PROFILE:
+    {profile}
+    ---
+    ANALYZE the cached drug data for {gname} and return all conflicts. If no conflicts are found, return a single "INFO" alert.
+    """
+
+BATCH_USER_PROMPT_TEMPLATE = """
+    PATIENT PROFILE:
+    {profile}
+
+    {drug_sections}
+    ANALYZE each drug separately and return one entry per drug with all of its conflicts.
+    If no conflicts are found for a drug, return a single "INFO" alert for it.
+    """
+
+CACHED_BATCH_USER_PROMPT_TEMPLATE = """
+    PATIENT PROFILE:
+    {profile}
+    ---
+    ANALYZE each drug in the cached drug data separately and return one entry per drug with all of its conflicts.
+    If no conflicts are found for a drug, return a single "INFO" alert for it.
+    """
+
 # 3. Define the generation config, including the schema
 generation_config = {
     "response_mime_type": "application/json",
     "response_schema": response_schema
 }
 
+# 3b. Batched variant: one alert list per drug, so several drugs share a single LLM call
+batch_response_schema = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "drug": {
+                "type": "STRING",
+                "description": "The drug name exactly as given after 'DRUG DATA FOR:'."
+            },
+            "alerts": response_schema
+        },
+        "required": ["drug", "alerts"]
+    }
+}
+
+batch_generation_config = {
+    "response_mime_type": "application/json",
+    "response_schema": batch_response_schema
+}
+
 # 4. Configure the Gemini API and Model
 genai.configure(api_key=GEMINI_API_KEY)
 model = genai.GenerativeModel(
@@ -67,9 +153,62 @@ model = genai.GenerativeModel(
 )
 
 
+# 5. In-memory cache for openFDA label lookups (keyed on the upper-cased drug name)
+_DRUG_CACHE = TTLCache(maxsize=512, ttl=3600)
+_DRUG_LOCK = threading.RLock()
+
+# On-disk (SQLite) second tier for label lookups: survives restarts and is shared by all gunicorn workers
+DRUG_DISK_CACHE_TTL = 86400
+# Bump whenever the shape of drug_data (or how sections are cleaned/truncated) changes
+DRUG_DISK_CACHE_VERSION = "v1"
+# Disk cache failures are treated as a miss / skipped write rather than failing the lookup
+_DISK_CACHE_ERRORS = (diskcache.Timeout, sqlite3.Error, OSError)
+_DRUG_DISK_CACHE = diskcache.Cache(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fda_cache"),
+    size_limit=int(1e9)
+)
+
+# Label sections are whitespace-normalized and capped before caching to keep prompts (and responses) small
+MAX_SECTION_CHARS = 8000
+_WS_RE = re.compile(r'\s+')
+
+FDA_LABEL_URL = "https://api.fda.gov/drug/label.json"
+
+# Persistent HTTP session so openFDA lookups reuse pooled keep-alive TLS connections
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+# 6. In-memory cache for LLM alerts (keyed on a hash of the profile and the drug's label text)
+_LLM_CACHE = TTLCache(maxsize=4096, ttl=1800)
+_LLM_LOCK = threading.RLock()
+
+# 7. Gemini context caches holding the system prompt + label text (one drug, or the batched default list).
+#    Gemini rejects cached contexts under ~4,096 tokens, so short labels are sent inline.
+CONTEXT_CACHE_MODEL = "models/gemini-2.0-flash-001" # Context caching requires a pinned model version
+CONTEXT_CACHE_TTL = datetime.timedelta(hours=1)
+CONTEXT_CACHE_MIN_CHARS = 16000
+# Expire local handles well before Gemini drops the cached content server-side
+_LABEL_MODELS = TTLCache(maxsize=128, ttl=CONTEXT_CACHE_TTL.total_seconds() - 300)
+# Transient create failures (429, 5xx, timeouts) only skip context caching for a minute
+_LABEL_FAILURES = TTLCache(maxsize=128, ttl=60)
+# One lock per label being uploaded, so concurrent callers don't create duplicate cached contents
+_LABEL_CREATE_LOCKS = {}
+_LABEL_LOCK = threading.RLock()
+
+# 8. Shared worker pool for the I/O-bound openFDA + Gemini calls (reused across requests)
+_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="drug-worker")
+
+
 # --- Flask App Setup ---
-app = Flask(_name_)
+app = Flask(__name__)
 CORS(app) # Enable CORS
+# Gzip JSON responses only; compressing the NDJSON stream would buffer it
+app.config['COMPRESS_MIMETYPES'] = ['application/json']
+Compress(app)
 
 # --- "AI" KNOWLEDGE BASE ---
 COMMON_BP_DRUGS = [
@@ -83,14 +222,39 @@ COMMON_BP_DRUGS = [
 # --- Helper Functions ---
 
 def fetch_drug_data(drug_name):
-    """Fetches drug data from openFDA."""
-    search_field = f'(openfda.generic_name.exact:"{drug_name.upper()}" OR openfda.brand_name.exact:"{drug_name.upper()}")'
-    url = f"https://api.fda.gov/drug/label.json?search={search_field}&limit=1"
+    """
+    Fetches drug data from openFDA, serving repeat lookups from the in-memory
+    cache (L1) or the on-disk cache (L2).
+    """
+    key = drug_name.strip().upper()
+    with _DRUG_LOCK:
+        cached = _DRUG_CACHE.get(key)
+    if cached:
+        print(f"Drug cache hit for {key}")
+        return cached
+
+    disk_key = f"{DRUG_DISK_CACHE_VERSION}:{key}"
+    try:
+        cached = _DRUG_DISK_CACHE.get(disk_key)
+    except _DISK_CACHE_ERRORS as e:
+        print(f"Drug disk cache read failed for {key}: {e}")
+        cached = None
+    if cached:
+        print(f"Drug disk cache hit for {key}")
+        with _DRUG_LOCK:
+            _DRUG_CACHE[key] = cached
+        return cached
+    print(f"Drug cache miss for {key}")
+
+    # Quotes and backslashes would break out of (or escape the end of) the exact-match term
+    term = key.replace('\\', '').replace('"', '')
+    search_field = f'(openfda.generic_name.exact:"{term}" OR openfda.brand_name.exact:"{term}")'
+    url = f"{FDA_LABEL_URL}?search={quote_plus(search_field)}&limit=1"
     
     try:
-        response = requests.get(url, timeout=10)
+        response = _SESSION.get(url, timeout=10)
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         
         if data.get("error") or not data.get("results"):
             print(f"No results found for {drug_name}")
@@ -101,127 +265,377 @@ def fetch_drug_data(drug_name):
         def get_section_text(section_key):
             section_data = drug.get(section_key)
             if isinstance(section_data, list) and section_data:
-                return " ".join(section_data).lower()
+                text = _WS_RE.sub(" ", " ".join(section_data).lower()).strip()
+                if len(text) > MAX_SECTION_CHARS:
+                    text = text[:MAX_SECTION_CHARS] + " …[truncated]"
+                return text
             return "No information listed."
 
-        return {
-            "brandName": ", ".join(drug.get("openfda", {}).get("brand_name", ["N/A"])),
-            "genericName": ", ".join(drug.get("openfda", {}).get("generic_name", [drug_name])),
+        # Sections are joined and lower-cased once here; the cached dict is used as-is downstream
+        drug_data = {
+            "brandName": sys.intern(", ".join(drug.get("openfda", {}).get("brand_name", ["N/A"]))),
+            "genericName": sys.intern(", ".join(drug.get("openfda", {}).get("generic_name", [drug_name]))),
             "contraindications": get_section_text("contraindications"),
             "warnings_and_precautions": get_section_text("warnings_and_precautions"),
             "drugInteractions": get_section_text("drug_interactions"),
             "adverseReactions": get_section_text("adverse_reactions")
         }
-    except requests.exceptions.RequestException as e:
+        with _DRUG_LOCK:
+            _DRUG_CACHE[key] = drug_data
+        try:
+            _DRUG_DISK_CACHE.set(disk_key, drug_data, expire=DRUG_DISK_CACHE_TTL)
+        except _DISK_CACHE_ERRORS as e:
+            print(f"Drug disk cache write failed for {key}: {e}")
+        return drug_data
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         print(f"Error fetching data for {drug_name}: {e}")
         return None
 
-def analyze_with_llm(patient_profile_text, drug_data):
+def get_label_text(drug_data):
+    """Formats the four label sections of a drug for the LLM prompt."""
+    return LABEL_PROMPT_TEMPLATE.format_map(drug_data)
+
+def get_label_model(drug_data):
     """
-    Uses the Gemini LLM to analyze the patient profile against the drug data.
+    Returns a model bound to a Gemini context cache holding the system prompt and
+    this drug's label text, or None if the label is too short to be cached.
     """
-    user_prompt = f"""
-    PATIENT PROFILE:
-    {patient_profile_text}
+    return get_context_model(get_label_text(drug_data), generation_config, drug_data["genericName"])
 
-    DRUG DATA FOR: {drug_data['genericName']}
-    ---
-    CONTRAINDICATIONS:
-    {drug_data['contraindications']}
-    ---
-    WARNINGS AND PRECAUTIONS:
-    {drug_data['warnings_and_precautions']}
-    ---
-    DRUG INTERACTIONS:
-    {drug_data['drugInteractions']}
-    ---
-    ADVERSE REACTIONS:
-    {drug_data['adverseReactions']}
-    ---
-    ANALYZE and return all conflicts. If no conflicts are found, return a single "INFO" alert.
+def get_context_model(context_text, config, description):
     """
-    
-    max_retries = 3
-    delay = 1
-    
-    for attempt in range(max_retries):
+    Returns a model bound to a Gemini context cache holding the system prompt and
+    context_text, or None if the text is too short (or currently failing) to be cached.
+    """
+    if len(context_text) < CONTEXT_CACHE_MIN_CHARS:
+        return None
+
+    key = hashlib.sha256(context_text.encode()).hexdigest()
+    with _LABEL_LOCK:
+        if key in _LABEL_MODELS:
+            return _LABEL_MODELS[key]
+        if key in _LABEL_FAILURES:
+            return None
+        create_lock = _LABEL_CREATE_LOCKS.setdefault(key, threading.Lock())
+
+    with create_lock:
+        # Another caller may have finished the upload while we waited
+        with _LABEL_LOCK:
+            if key in _LABEL_MODELS:
+                return _LABEL_MODELS[key]
+            if key in _LABEL_FAILURES:
+                return None
+
         try:
-            response = model.generate_content(user_prompt)
-            alerts = json.loads(response.text)
-            return alerts
+            cached_content = genai.caching.CachedContent.create(
+                model=CONTEXT_CACHE_MODEL,
+                display_name=f"context-{key[:16]}",
+                system_instruction=system_prompt,
+                contents=[context_text],
+                ttl=CONTEXT_CACHE_TTL
+            )
+            context_model = genai.GenerativeModel.from_cached_content(
+                cached_content,
+                generation_config=config
+            )
+            with _LABEL_LOCK:
+                _LABEL_MODELS[key] = context_model
+            return context_model
+
+        except gexc.InvalidArgument as e:
+            # Permanent for this text (e.g. too few tokens to cache): send it inline until the entry expires
+            print(f"Context cache rejected for {description}: {e}")
+            with _LABEL_LOCK:
+                _LABEL_MODELS[key] = None
+            return None
 
         except Exception as e:
-            print(f"Error calling LLM on attempt {attempt + 1}: {e}")
-            raw_response = "No response object"
-            if "response" in locals():
-                try:
-                    raw_response = response.text
-                except Exception:
-                    raw_response = "Could not get response.text"
-            print(f"LLM Response (raw): {raw_response}")
-            
-            if "429" in str(e) or "503" in str(e):
-                print(f"Rate limit or server error. Retrying in {delay} seconds...")
-                time.sleep(delay)
-                delay *= 2
-            else:
-                return [{"type": "🔴 ERROR", "finding": f"Could not analyze drug: {str(e)}"}]
+            print(f"Could not create context cache for {description}, retrying later: {e}")
+            with _LABEL_LOCK:
+                _LABEL_FAILURES[key] = True
+            return None
+
+        finally:
+            with _LABEL_LOCK:
+                _LABEL_CREATE_LOCKS.pop(key, None)
+
+def log_llm_retry(retry_state):
+    """Logs each failed LLM attempt before tenacity sleeps and retries."""
+    print(f"Error calling LLM on attempt {retry_state.attempt_number}: {retry_state.outcome.exception()}")
+    print(f"Rate limit or server error. Retrying in {retry_state.next_action.sleep:.1f} seconds...")
+
+@retry(
+    retry=retry_if_exception_type((gexc.ResourceExhausted, gexc.ServiceUnavailable)), # 429 / 503
+    wait=wait_random_exponential(multiplier=1, max=8),
+    stop=stop_after_attempt(3),
+    before_sleep=log_llm_retry
+)
+def call_llm(llm, user_prompt, **kwargs):
+    """Calls generate_content, retrying transient errors with jittered exponential backoff."""
+    return llm.generate_content(user_prompt, **kwargs)
+
+def get_llm_cache_key(patient_profile_text, drug_data):
+    """Hashes the profile and the drug's label text into an LLM cache key."""
+    return hashlib.sha256(
+        f"{patient_profile_text}|{drug_data['genericName']}|{drug_data['contraindications']}|"
+        f"{drug_data['warnings_and_precautions']}|{drug_data['drugInteractions']}|{drug_data['adverseReactions']}".encode()
+    ).hexdigest()
+
+def analyze_with_llm(patient_profile_text, drug_data):
+    """
+    Uses the Gemini LLM to analyze the patient profile against the drug data.
+    Identical (profile, drug label) pairs are served from the LLM cache.
+    """
+    key = get_llm_cache_key(patient_profile_text, drug_data)
+    with _LLM_LOCK:
+        cached = _LLM_CACHE.get(key)
+    if cached:
+        print(f"LLM cache hit for {drug_data['genericName']}")
+        return cached
+
+    label_model = get_label_model(drug_data)
+    if label_model:
+        llm = label_model
+        user_prompt = CACHED_USER_PROMPT_TEMPLATE.format_map({
+            "profile": patient_profile_text,
+            "gname": drug_data["genericName"]
+        })
+    else:
+        llm = model
+        user_prompt = USER_PROMPT_TEMPLATE.format_map({
+            "profile": patient_profile_text,
+            "label": get_label_text(drug_data)
+        })
+    
+    response = None
+    try:
+        response = call_llm(llm, user_prompt)
+        alerts = orjson.loads(response.text)
+        with _LLM_LOCK:
+            _LLM_CACHE[key] = alerts
+        return alerts
+
+    except RetryError:
+        return [{"type": "🔴 ERROR", "finding": "Could not analyze drug after multiple retries."}]
+
+    except Exception as e:
+        print(f"Error calling LLM: {e}")
+        raw_response = "No response object"
+        if response is not None:
+            try:
+                raw_response = response.text
+            except Exception:
+                raw_response = "Could not get response.text"
+        print(f"LLM Response (raw): {raw_response}")
+        return [{"type": "🔴 ERROR", "finding": f"Could not analyze drug: {str(e)}"}]
 
-    return [{"type": "🔴 ERROR", "finding": "Could not analyze drug after multiple retries."}]
+@lru_cache(maxsize=1024)
+def _profile_text_cached(vitals, notes, allergies, meds):
+    return f"""
+    - Vitals: {vitals}
+    - Notes/History: {notes}
+    - Allergies: {', '.join(allergies) or 'N/A'}
+    - Other Medications: {', '.join(meds) or 'N/A'}
+    """
 
 def get_profile_text(profile):
     """Helper function to convert patient profile JSON to text for the LLM."""
-    return f"""
-    - Vitals: {profile.get('vitals', 'N/A')}
-    - Notes/History: {profile.get('notes', 'N/A')}
-    - Allergies: {', '.join(profile.get('allergies', [])) or 'N/A'}
-    - Other Medications: {', '.join(profile.get('meds', [])) or 'N/A'}
+    args = (
+        profile.get('vitals', 'N/A'),
+        profile.get('notes', 'N/A'),
+        tuple(profile.get('allergies', [])),
+        tuple(profile.get('meds', []))
+    )
+    try:
+        return _profile_text_cached(*args)
+    except TypeError:
+        # Unhashable values (e.g. nested objects) bypass the cache
+        return _profile_text_cached.__wrapped__(*args)
+
+def iter_llm_batch(patient_profile_text, drug_datas):
+    """
+    Analyzes several drugs against the patient profile in a single streamed LLM call,
+    yielding (index into drug_datas, alerts) pairs as each drug's entry arrives.
+    Drugs missing from (or malformed in) the batched response fall back to analyze_with_llm;
+    if the Gemini call itself fails, every pending drug gets an error alert instead.
+    """
+    pending = []
+    for i, drug_data in enumerate(drug_datas):
+        with _LLM_LOCK:
+            cached = _LLM_CACHE.get(get_llm_cache_key(patient_profile_text, drug_data))
+        if cached:
+            print(f"LLM cache hit for {drug_data['genericName']}")
+            yield i, cached
+        else:
+            pending.append(i)
+
+    done = set()
+    if len(pending) > 1:
+        indices_by_name = {}
+        for i in pending:
+            indices_by_name.setdefault(drug_datas[i]["genericName"].strip().lower(), []).append(i)
+
+        drug_sections = "\n".join(
+            f"=== DRUG {n}: {drug_datas[i]['genericName']} ===\n    {get_label_text(drug_datas[i])}"
+            for n, i in enumerate(pending, start=1)
+        )
+        # The label block for the default drug list is static, so it lives in a context cache when possible
+        batch_model = get_context_model(drug_sections, batch_generation_config, "batched drug labels")
+        if batch_model:
+            llm = batch_model
+            call_kwargs = {}
+            user_prompt = CACHED_BATCH_USER_PROMPT_TEMPLATE.format_map({"profile": patient_profile_text})
+        else:
+            llm = model
+            call_kwargs = {"generation_config": batch_generation_config}
+            user_prompt = BATCH_USER_PROMPT_TEMPLATE.format_map({
+                "profile": patient_profile_text,
+                "drug_sections": drug_sections
+            })
+
+        api_error = None
+        try:
+            response = call_llm(llm, user_prompt, stream=True, **call_kwargs)
+            for entry in iter_json_array(chunk.text for chunk in response):
+                if not (isinstance(entry, dict) and isinstance(entry.get("drug"), str)
+                        and isinstance(entry.get("alerts"), list) and entry["alerts"]):
+                    continue
+                alerts = entry["alerts"]
+                for i in indices_by_name.pop(entry["drug"].strip().lower(), []):
+                    with _LLM_LOCK:
+                        _LLM_CACHE[get_llm_cache_key(patient_profile_text, drug_datas[i])] = alerts
+                    done.add(i)
+                    yield i, alerts
+        except RetryError:
+            api_error = "Could not analyze drug after multiple retries."
+        except gexc.GoogleAPIError as e:
+            api_error = f"Could not analyze drug: {str(e)}"
+        except Exception as e:
+            print(f"Could not read batched LLM response, falling back to per-drug calls: {e}")
+
+        if api_error:
+            # Gemini itself is failing (e.g. a rate-limit burst); per-drug calls would only add load
+            print(f"Error calling batched LLM: {api_error}")
+            for i in pending:
+                if i not in done:
+                    done.add(i)
+                    yield i, [{"type": "🔴 ERROR", "finding": api_error}]
+
+    # Anything not answered by the batch is analyzed on its own, concurrently
+    futures = {_EXECUTOR.submit(analyze_with_llm, patient_profile_text, drug_datas[i]): i
+               for i in pending if i not in done}
+    for future in as_completed(futures):
+        yield futures[future], future.result()
+
+def analyze_with_llm_batch(patient_profile_text, drug_datas):
+    """
+    Analyzes several drugs against the patient profile in a single LLM call.
+    Returns one alert list per drug, in the same order as drug_datas.
+    """
+    results = [None] * len(drug_datas)
+    for i, alerts in iter_llm_batch(patient_profile_text, drug_datas):
+        results[i] = alerts
+    return results
+
+def build_report(drug_def, drug_data, alerts, include_full=True):
+    """
+    Builds the report dict for one drug from COMMON_BP_DRUGS. Without include_full the
+    (large) label text is left out; the frontend loads it from /drug-label on demand.
+    """
+    if not drug_data:
+        return {
+            "drugName": drug_def["name"],
+            "genericName": drug_def["name"],
+            "brandName": "N/A",
+            "drugClass": drug_def["class"],
+            "alerts": [{"type": "🔴 ERROR", "finding": "Could not fetch drug data from openFDA."}],
+            "fullData": {}
+        }
+    
+    report = {
+        "drugName": drug_def["name"],
+        "genericName": drug_data["genericName"],
+        "brandName": drug_data["brandName"],
+        "drugClass": drug_def["class"],
+        "alerts": alerts
+    }
+    if include_full:
+        report["fullData"] = drug_data
+    return report
+
+def iter_report_lines(profile_text, drug_datas, include_full=True):
+    """Yields one NDJSON line per COMMON_BP_DRUGS report as soon as it is ready."""
+    try:
+        found = []
+        for drug_def, drug_data in zip(COMMON_BP_DRUGS, drug_datas):
+            if drug_data:
+                found.append((drug_def, drug_data))
+            else:
+                yield orjson.dumps(build_report(drug_def, None, None)) + b"\n"
+
+        for i, alerts in iter_llm_batch(profile_text, [drug_data for _, drug_data in found]):
+            drug_def, drug_data = found[i]
+            yield orjson.dumps(build_report(drug_def, drug_data, alerts, include_full)) + b"\n"
+
+    except Exception as e:
+        print(f"An error occurred while streaming /generate-report: {e}")
+        yield orjson.dumps({"error": str(e)}) + b"\n"
+
+def prewarm_drug_cache():
+    """Fetches COMMON_BP_DRUGS so the first /generate-report hits a warm cache."""
+    for drug_def in COMMON_BP_DRUGS:
+        fetch_drug_data(drug_def["name"])
+
+def start_prewarm_thread():
     """
+    Prewarms the drug cache in a daemon thread, so it never blocks startup or exit.
+    Called from __main__ and from gunicorn's post_worker_init hook, not at import.
+    """
+    threading.Thread(target=prewarm_drug_cache, name="drug-prewarm", daemon=True).start()
+
+def json_response(payload, status=200):
+    """Serializes payload with orjson into a Flask JSON response."""
+    return app.response_class(orjson.dumps(payload), status=status, mimetype='application/json')
 
 # --- API Endpoints ---
 
 @app.route('/generate-report', methods=['POST'])
 def generate_report():
-    """Generates the main summary report for the default list of BP drugs."""
+    """
+    Generates the main summary report for the default list of BP drugs.
+    With ?stream=1 the reports are streamed as NDJSON, one line per drug as it completes.
+    The label text (fullData) is only included with ?include_full=1.
+    """
     try:
         profile = request.json
         if not profile:
-            return jsonify({"error": "No patient profile provided"}), 400
+            return json_response({"error": "No patient profile provided"}, 400)
             
         profile_text = get_profile_text(profile)
-        all_reports = []
+        include_full = request.args.get('include_full', '0') == '1'
 
-        for drug_def in COMMON_BP_DRUGS:
-            drug_name = drug_def["name"]
-            drug_data = fetch_drug_data(drug_name)
-            
-            if not drug_data:
-                report = {
-                    "genericName": drug_name,
-                    "brandName": "N/A",
-                    "drugClass": drug_def["class"],
-                    "alerts": [{"type": "🔴 ERROR", "finding": "Could not fetch drug data from openFDA."}],
-                    "fullData": {}
-                }
-                all_reports.append(report)
-                continue
-            
-            alerts = analyze_with_llm(profile_text, drug_data)
-            
-            report = {
-                "genericName": drug_data["genericName"],
-                "brandName": drug_data["brandName"],
-                "drugClass": drug_def["class"],
-                "alerts": alerts,
-                "fullData": drug_data
-            }
-            all_reports.append(report)
+        # 1. Fetch all drug labels concurrently
+        futures = [_EXECUTOR.submit(fetch_drug_data, drug_def["name"]) for drug_def in COMMON_BP_DRUGS]
+        drug_datas = [future.result() for future in futures]
+
+        if request.args.get('stream', '0') == '1':
+            return app.response_class(iter_report_lines(profile_text, drug_datas, include_full), mimetype='application/x-ndjson')
+
+        # 2. Analyze every drug we found in one batched LLM call
+        found = [drug_data for drug_data in drug_datas if drug_data]
+        found_alerts = iter(analyze_with_llm_batch(profile_text, found))
 
-        return jsonify(all_reports)
+        # 3. Build the reports in COMMON_BP_DRUGS order (found_alerts follows the same order)
+        all_reports = [
+            build_report(drug_def, drug_data, next(found_alerts) if drug_data else None, include_full)
+            for drug_def, drug_data in zip(COMMON_BP_DRUGS, drug_datas)
+        ]
+
+        return json_response(all_reports)
 
     except Exception as e:
         print(f"An error occurred in /generate-report: {e}")
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 @app.route('/check-drug', methods=['POST'])
 def check_single_drug():
@@ -229,7 +643,7 @@ def check_single_drug():
     try:
         data = request.json
         if not data or 'profile' not in data or 'drugName' not in data:
-            return jsonify({"error": "Missing profile or drugName"}), 400
+            return json_response({"error": "Missing profile or drugName"}, 400)
 
         profile = data['profile']
         drug_name = data['drugName']
@@ -238,7 +652,7 @@ def check_single_drug():
         # 1. Fetch drug data
         drug_data = fetch_drug_data(drug_name)
         if not drug_data:
-            return jsonify({
+            return json_response({
                 "genericName": drug_name,
                 "brandName": "N/A",
                 "drugClass": "Custom Search",
@@ -257,15 +671,34 @@ def check_single_drug():
             "alerts": alerts,
             "fullData": drug_data
         }
-        return jsonify(report)
+        return json_response(report)
 
     except Exception as e:
         print(f"An error occurred in /check-drug: {e}")
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
+
+@app.route('/drug-label', methods=['GET'])
+def get_drug_label():
+    """Returns the full FDA label sections for one drug (the fullData of a report)."""
+    try:
+        drug_name = request.args.get('name', '').strip()
+        if not drug_name:
+            return json_response({"error": "Missing drug name"}, 400)
+
+        drug_data = fetch_drug_data(drug_name)
+        if not drug_data:
+            return json_response({"error": f"Could not fetch drug data for '{drug_name}'."}, 404)
+
+        return json_response(drug_data)
+
+    except Exception as e:
+        print(f"An error occurred in /drug-label: {e}")
+        return json_response({"error": str(e)}, 500)
 
 # --- Run the App ---
-if _name_ == '_main_':
+if __name__ == '__main__':
     print("Starting Flask server...")
+    start_prewarm_thread()
     print("Your backend is running at http://127.0.0.1:5000")
     print("Open the index.html file in your browser to use the app.")
     app.run(port=5000, debug=False)
\ No newline at end of file
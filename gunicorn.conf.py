@@ -0,0 +1,23 @@
+import os
+
+# --- Gunicorn Configuration ---
+# Run with: gunicorn -c gunicorn.conf.py app:app
+
+bind = os.getenv("BIND", "127.0.0.1:5000")
+
+# The app is I/O-bound (openFDA + Gemini), so concurrency comes from threads, not processes.
+# Each worker keeps its own LLM cache, Gemini context-cache handles and worker pool, so every
+# extra worker lowers the cache hit rate and uploads its own copy of the cached label contexts.
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+threads = 16
+
+# With gthread this is only the worker heartbeat timeout; it does not cap how long a request
+# (waiting on openFDA and the LLM) may take.
+timeout = 30
+
+
+def post_worker_init(worker):
+    # Warm the openFDA cache once the worker has loaded the app (not at import time)
+    from app import start_prewarm_thread
+    start_prewarm_thread()
@@ -0,0 +1,29 @@
+import json
+
+_JSON_DECODER = json.JSONDecoder()
+
+def iter_json_array(chunks):
+    """
+    Incrementally parses a top-level JSON array of objects from streamed text chunks,
+    yielding each object as soon as its closing brace has arrived.
+
+    Only object items are decoded: anything else between them (the brackets, separators,
+    stray scalars) is skipped, so a scalar split across chunks is never emitted in pieces.
+    """
+    buf = ""
+    for chunk in chunks:
+        buf += chunk
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] not in "{]":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return # End of the top-level array
+            if pos >= len(buf):
+                break
+            try:
+                item, pos = _JSON_DECODER.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break # The next object hasn't fully arrived yet
+            yield item
+        buf = buf[pos:]
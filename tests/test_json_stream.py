@@ -0,0 +1,35 @@
+import unittest
+
+from json_stream import iter_json_array
+
+
+def split(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class IterJsonArrayTest(unittest.TestCase):
+
+    def test_objects_at_every_split_size(self):
+        text = '[ {"drug": "a", "alerts": [{"type": "x", "finding": "a, ] {b}"}]} ,\n {"drug": "b", "alerts": []} ]'
+        expected = [
+            {"drug": "a", "alerts": [{"type": "x", "finding": "a, ] {b}"}]},
+            {"drug": "b", "alerts": []},
+        ]
+        for size in range(1, len(text) + 1):
+            with self.subTest(size=size):
+                self.assertEqual(list(iter_json_array(split(text, size))), expected)
+
+    def test_scalars_are_never_split_into_items(self):
+        self.assertEqual(list(iter_json_array(['[12', '3, 4]'])), [])
+        self.assertEqual(list(iter_json_array(['[12', '3, {"a": 1}]'])), [{"a": 1}])
+
+    def test_empty_and_truncated_arrays(self):
+        self.assertEqual(list(iter_json_array(['[]'])), [])
+        self.assertEqual(list(iter_json_array(['[{"a": 1}, {"a"', ': 2'])), [{"a": 1}])
+
+    def test_stops_at_end_of_array(self):
+        self.assertEqual(list(iter_json_array(['[{"a": 1}]', ' {"a": 2}'])), [{"a": 1}])
+
+
+if __name__ == '__main__':
+    unittest.main()